@@ -2,11 +2,13 @@ from flask import Flask, render_template, request, redirect, url_for, flash
 from config import Config
 from sqlalchemy.orm import joinedload
 from models import DatabaseManager, ModelFactory, Client, Vehicle, Service, Part, ServicePart
+from backup import init_backup
 import datetime
 
 app = Flask(__name__)
 app.config.from_object(Config)
 db_manager = DatabaseManager(app.config["SQLALCHEMY_DATABASE_URI"])
+backup_manager = init_backup(app, db_manager)
 
 # Rota para a página inicial
 @app.route('/')
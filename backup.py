@@ -0,0 +1,536 @@
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import click
+from flask.cli import AppGroup
+
+logger = logging.getLogger(__name__)
+
+# Cabeçalho de cada página gravada num snapshot incremental (número da página, big-endian)
+_PAGE_HEADER = struct.Struct('>I')
+
+# Prefixo da cópia bruta temporária; sobras de execuções interrompidas são removidas
+_RAW_PREFIX = '.snapshot-'
+
+
+class BackupError(Exception):
+    """Erro ao criar, verificar ou restaurar um snapshot."""
+
+
+class _BackupLock:
+    """
+    Lock de arquivo em BACKUP_DIR, para que dois processos (por exemplo o
+    comando 'flask backup create' e o 'flask backup schedule') não criem
+    snapshots ao mesmo tempo.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            self._file.close()
+            raise BackupError("Outro backup já está em andamento")
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+
+
+class WriteStallProbe(threading.Thread):
+    """
+    Sonda que mede quanto tempo um escritor espera pelo lock de escrita
+    durante o backup. Usa uma conexão própria executando 'BEGIN IMMEDIATE;
+    ROLLBACK', então mede a espera de qualquer processo, não só das sessões
+    deste processo.
+    """
+    def __init__(self, database, interval=0.01):
+        super().__init__(name='backup-write-probe', daemon=True)
+        self.database = database
+        self.interval = interval
+        self.longest = 0.0
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        connection = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+        try:
+            while not self._stop_event.is_set():
+                start = time.perf_counter()
+                try:
+                    connection.execute('BEGIN IMMEDIATE')
+                    connection.execute('ROLLBACK')
+                except sqlite3.OperationalError:
+                    logger.warning("Sonda de escrita não obteve o lock")
+                self.longest = max(self.longest, time.perf_counter() - start)
+                self.samples += 1
+                self._stop_event.wait(self.interval)
+        finally:
+            connection.close()
+
+    def stop(self):
+        """
+        Encerra a sonda.
+
+        Returns:
+            tuple: (maior espera em segundos, quantidade de medições).
+        """
+        self._stop_event.set()
+        self.join()
+        return self.longest, self.samples
+
+
+class BackupReport:
+    """Resumo de um snapshot criado pelo BackupManager."""
+    def __init__(self, manifest, duration, pages_copied, steps, restarts, longest_write_stall, stall_samples):
+        self.manifest = manifest
+        self.duration = duration
+        self.pages_copied = pages_copied
+        self.steps = steps
+        self.restarts = restarts
+        self.longest_write_stall = longest_write_stall
+        self.stall_samples = stall_samples
+
+    @property
+    def pages_per_second(self):
+        return self.pages_copied / self.duration if self.duration > 0 else float(self.pages_copied)
+
+    def __str__(self):
+        manifest = self.manifest
+        return (
+            f"Snapshot {manifest['name']} ({manifest['kind']}): "
+            f"{manifest['page_count']} páginas, {len(manifest['changed_pages'])} gravadas, "
+            f"{manifest['size']} bytes comprimidos\n"
+            f"Duração: {self.duration:.3f}s, {self.pages_copied} páginas copiadas em {self.steps} passos "
+            f"({self.pages_per_second:.0f} páginas/s, {self.restarts} reinícios)\n"
+            f"Maior espera de escrita: {self.longest_write_stall * 1000:.1f} ms "
+            f"({self.stall_samples} medições)"
+        )
+
+
+class BackupManager:
+    """
+    Cria snapshots do banco SQLite sem parar a aplicação.
+
+    O banco é colocado em modo WAL e a cópia é feita com a API de backup
+    online do SQLite a partir de uma transação de leitura mantida aberta,
+    em passos de poucas páginas. Assim a cópia vê um estado consistente,
+    não é reiniciada pelos commits das requisições e não bloqueia os
+    escritores. Cada snapshot é comprimido com gzip e acompanhado de um
+    manifesto JSON com o checksum SHA-256 do arquivo e o hash de cada
+    página, o que permite gerar snapshots incrementais contendo apenas as
+    páginas alteradas desde o snapshot anterior.
+    """
+    def __init__(self, db_manager, backup_dir='backups', pages_per_step=64, step_pause=0.005,
+                 timeout=600, max_restarts=3):
+        self.db_manager = db_manager
+        self.backup_dir = backup_dir
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+        self.timeout = timeout
+        self.max_restarts = max_restarts
+
+    @property
+    def database(self):
+        database = self.db_manager.engine.url.database
+        if not database or database == ':memory:':
+            raise BackupError("O backup online requer um banco SQLite em arquivo")
+        return database
+
+    @property
+    def db_name(self):
+        return os.path.splitext(os.path.basename(self.database))[0]
+
+    def create_snapshot(self, incremental=False):
+        """
+        Cria um novo snapshot do banco de dados.
+
+        Args:
+            incremental (bool): Grava apenas as páginas alteradas desde o último
+                snapshot. Sem snapshot anterior compatível, cria um completo.
+
+        Returns:
+            BackupReport: Resumo do snapshot criado.
+
+        Raises:
+            BackupError: Se outro backup estiver em andamento, ou se a cópia
+                exceder o timeout ou o limite de reinícios.
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        with _BackupLock(os.path.join(self.backup_dir, '.lock')):
+            self._remove_stale_files()
+            fd, raw_path = tempfile.mkstemp(prefix=_RAW_PREFIX, suffix='.db', dir=self.backup_dir)
+            os.close(fd)
+            try:
+                copy_stats = self._online_copy(raw_path)
+                manifest = self._write_snapshot(raw_path, incremental)
+            finally:
+                for path in (raw_path, raw_path + '-journal'):
+                    if os.path.exists(path):
+                        os.remove(path)
+            return BackupReport(manifest, *copy_stats)
+
+    def _remove_stale_files(self):
+        """Remove cópias brutas e arquivos parciais deixados por execuções interrompidas."""
+        for file_name in os.listdir(self.backup_dir):
+            if file_name.startswith(_RAW_PREFIX) or file_name.endswith('.part'):
+                os.remove(os.path.join(self.backup_dir, file_name))
+
+    def _online_copy(self, target_path):
+        """Copia o banco para target_path em passos de pages_per_step páginas."""
+        stats = {'steps': 0, 'pages': 0, 'restarts': 0, 'remaining': None}
+        start = time.perf_counter()
+
+        def progress(status, remaining, total):
+            stats['steps'] += 1
+            previous = stats['remaining']
+            if previous is None:
+                stats['pages'] += total - remaining
+            elif remaining > previous:
+                # A cópia recomeçou da primeira página
+                stats['restarts'] += 1
+                stats['pages'] += total - remaining
+            else:
+                stats['pages'] += previous - remaining
+            stats['remaining'] = remaining
+            if stats['restarts'] > self.max_restarts:
+                raise BackupError(f"O backup foi reiniciado {stats['restarts']} vezes")
+            if time.perf_counter() - start > self.timeout:
+                raise BackupError(f"O backup excedeu o timeout de {self.timeout}s")
+            if remaining and self.step_pause:
+                time.sleep(self.step_pause)
+
+        source = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+        target = sqlite3.connect(target_path)
+        probe = WriteStallProbe(self.database)
+        try:
+            if source.execute('PRAGMA journal_mode=WAL').fetchone()[0] != 'wal':
+                raise BackupError("Não foi possível ativar o modo WAL no banco de dados")
+            # A transação de leitura fixa o estado copiado até o último passo
+            source.execute('BEGIN')
+            source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+            probe.start()
+            source.backup(target, pages=self.pages_per_step, progress=progress)
+        finally:
+            duration = time.perf_counter() - start
+            longest, samples = probe.stop() if probe.ident else (0.0, 0)
+            target.close()
+            source.close()
+        return duration, stats['pages'], stats['steps'], stats['restarts'], longest, samples
+
+    def _write_snapshot(self, raw_path, incremental):
+        """Comprime a cópia bruta (completa ou só as páginas alteradas) e grava o manifesto."""
+        page_size = self._page_size(raw_path)
+        page_hashes = []
+        with open(raw_path, 'rb') as raw:
+            for page in iter(lambda: raw.read(page_size), b''):
+                page_hashes.append(hashlib.blake2b(page, digest_size=16).hexdigest())
+
+        parent = self.latest_manifest() if incremental else None
+        if parent is not None and parent['page_size'] != page_size:
+            parent = None
+
+        created_at = datetime.datetime.now()
+        name = f"{self.db_name}-{created_at.strftime('%Y%m%d-%H%M%S-%f')}"
+        if parent is None:
+            kind = 'full'
+            changed = list(range(len(page_hashes)))
+            file_name = f"{name}.db.gz"
+        else:
+            kind = 'incremental'
+            old_hashes = parent['page_hashes']
+            changed = [number for number, digest in enumerate(page_hashes)
+                       if number >= len(old_hashes) or old_hashes[number] != digest]
+            file_name = f"{name}.delta.gz"
+
+        file_path = os.path.join(self.backup_dir, file_name)
+        partial_path = file_path + '.part'
+        with open(raw_path, 'rb') as raw, gzip.open(partial_path, 'wb') as out:
+            if kind == 'full':
+                shutil.copyfileobj(raw, out)
+            else:
+                for number in changed:
+                    raw.seek(number * page_size)
+                    out.write(_PAGE_HEADER.pack(number))
+                    out.write(raw.read(page_size))
+        os.replace(partial_path, file_path)
+
+        manifest = {
+            'name': name,
+            'kind': kind,
+            'parent': parent['name'] if parent else None,
+            'created_at': created_at.isoformat(),
+            'file': file_name,
+            'sha256': self._sha256(file_path),
+            'size': os.path.getsize(file_path),
+            'page_size': page_size,
+            'page_count': len(page_hashes),
+            'changed_pages': changed,
+            'page_hashes': page_hashes,
+        }
+        # O manifesto é gravado por último: só existe snapshot com arquivo completo
+        manifest_path = os.path.join(self.backup_dir, f"{name}.json")
+        with open(manifest_path + '.part', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + '.part', manifest_path)
+        return manifest
+
+    def list_manifests(self):
+        """Retorna os manifestos dos snapshots existentes, do mais antigo ao mais recente."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        prefix = f"{self.db_name}-"
+        names = sorted(f for f in os.listdir(self.backup_dir)
+                       if f.startswith(prefix) and f.endswith('.json'))
+        return [self.load_manifest(name[:-len('.json')]) for name in names]
+
+    def latest_manifest(self):
+        manifests = self.list_manifests()
+        return manifests[-1] if manifests else None
+
+    def load_manifest(self, name):
+        path = os.path.join(self.backup_dir, f"{name}.json")
+        if not os.path.exists(path):
+            raise BackupError(f"Snapshot não encontrado: {name}")
+        with open(path) as f:
+            return json.load(f)
+
+    def _chain(self, name):
+        """Retorna a cadeia de manifestos do snapshot completo até o snapshot pedido."""
+        chain = [self.load_manifest(name)]
+        while chain[0]['parent']:
+            chain.insert(0, self.load_manifest(chain[0]['parent']))
+        return chain
+
+    def verify(self, name, deep=False):
+        """
+        Verifica os checksums do snapshot e de todos os snapshots dos quais ele depende.
+
+        Args:
+            name (str): Nome do snapshot.
+            deep (bool): Também restaura o snapshot num arquivo temporário e roda
+                o PRAGMA integrity_check.
+
+        Raises:
+            BackupError: Se algum arquivo estiver ausente ou corrompido.
+        """
+        for manifest in self._chain(name):
+            file_path = os.path.join(self.backup_dir, manifest['file'])
+            if not os.path.exists(file_path):
+                raise BackupError(f"Arquivo ausente: {manifest['file']}")
+            if self._sha256(file_path) != manifest['sha256']:
+                raise BackupError(f"Checksum inválido: {manifest['file']}")
+        if deep:
+            temp_dir = tempfile.mkdtemp()
+            try:
+                self.restore(name, os.path.join(temp_dir, 'verify.db'))
+            finally:
+                shutil.rmtree(temp_dir)
+
+    def restore(self, name, target_path, overwrite=False):
+        """
+        Reconstrói o banco de dados de um snapshot em target_path.
+
+        O banco é montado em target_path + '.part' e só substitui o destino
+        depois de conferido com o manifesto e com o PRAGMA integrity_check.
+
+        Args:
+            name (str): Nome do snapshot.
+            target_path (str): Arquivo de destino.
+            overwrite (bool): Permite sobrescrever um arquivo existente.
+
+        Raises:
+            BackupError: Se o destino existir, ou se o banco reconstruído não
+                corresponder ao manifesto.
+        """
+        if os.path.exists(target_path) and not overwrite:
+            raise BackupError(f"O arquivo de destino já existe: {target_path}")
+        chain = self._chain(name)
+        partial_path = target_path + '.part'
+        try:
+            self._rebuild(chain, partial_path)
+            self._check_restored(chain[-1], partial_path)
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        os.replace(partial_path, target_path)
+
+    def _rebuild(self, chain, path):
+        """Descomprime o snapshot completo e aplica os incrementais em ordem."""
+        with open(path, 'wb') as target:
+            for manifest in chain:
+                page_size = manifest['page_size']
+                with gzip.open(os.path.join(self.backup_dir, manifest['file']), 'rb') as src:
+                    if manifest['kind'] == 'full':
+                        shutil.copyfileobj(src, target)
+                    else:
+                        for header in iter(lambda: src.read(_PAGE_HEADER.size), b''):
+                            (number,) = _PAGE_HEADER.unpack(header)
+                            target.seek(number * page_size)
+                            target.write(src.read(page_size))
+                target.truncate(manifest['page_count'] * page_size)
+
+    def _check_restored(self, manifest, path):
+        """Confere as páginas do banco reconstruído e roda o PRAGMA integrity_check."""
+        with open(path, 'rb') as restored:
+            for number, expected in enumerate(manifest['page_hashes']):
+                page = restored.read(manifest['page_size'])
+                if hashlib.blake2b(page, digest_size=16).hexdigest() != expected:
+                    raise BackupError(f"Página {number} não confere com o manifesto de {manifest['name']}")
+        connection = sqlite3.connect(path)
+        try:
+            result = connection.execute('PRAGMA integrity_check').fetchone()[0]
+        finally:
+            connection.close()
+        if result != 'ok':
+            raise BackupError(f"Falha no integrity_check de {manifest['name']}: {result}")
+
+    @staticmethod
+    def _page_size(path):
+        connection = sqlite3.connect(path)
+        try:
+            return connection.execute('PRAGMA page_size').fetchone()[0]
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _sha256(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+class BackupScheduler(threading.Thread):
+    """
+    Tarefa que cria um snapshot a cada intervalo.
+    A cada full_every snapshots um é completo; os demais são incrementais.
+    """
+    def __init__(self, backup_manager, interval_minutes, full_every=24):
+        super().__init__(name='backup-scheduler', daemon=True)
+        self.backup_manager = backup_manager
+        self.interval = interval_minutes * 60
+        self.full_every = max(full_every, 1)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        count = 0
+        while not self._stop_event.wait(self.interval):
+            try:
+                report = self.backup_manager.create_snapshot(incremental=count % self.full_every != 0)
+                logger.info(str(report))
+            except Exception:
+                logger.exception("Erro ao criar o snapshot agendado")
+            count += 1
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def init_backup(app, db_manager):
+    """
+    Configura o backup para a aplicação e registra o comando 'flask backup'.
+
+    Returns:
+        BackupManager: O gerenciador de backup da aplicação.
+    """
+    manager = BackupManager(
+        db_manager,
+        backup_dir=app.config['BACKUP_DIR'],
+        pages_per_step=app.config['BACKUP_PAGES_PER_STEP'],
+        step_pause=app.config['BACKUP_STEP_PAUSE'],
+        timeout=app.config['BACKUP_TIMEOUT'],
+        max_restarts=app.config['BACKUP_MAX_RESTARTS'],
+    )
+    app.cli.add_command(_backup_cli(manager, app.config))
+    return manager
+
+
+def _backup_cli(manager, config):
+    backup_cli = AppGroup('backup', help='Backup online do banco de dados.')
+
+    @backup_cli.command('create')
+    @click.option('--incremental', is_flag=True, help='Grava apenas as páginas alteradas desde o último snapshot.')
+    def create(incremental):
+        """Cria um snapshot sem parar a aplicação."""
+        try:
+            report = manager.create_snapshot(incremental=incremental)
+        except BackupError as e:
+            raise click.ClickException(str(e))
+        click.echo(str(report))
+
+    @backup_cli.command('schedule')
+    @click.option('--interval', type=float, default=config['BACKUP_INTERVAL_MINUTES'], show_default=True,
+                  help='Intervalo entre os snapshots, em minutos.')
+    @click.option('--full-every', type=int, default=config['BACKUP_FULL_EVERY'], show_default=True,
+                  help='A cada quantos snapshots um é completo.')
+    def schedule(interval, full_every):
+        """Cria snapshots periodicamente até ser interrompido (Ctrl+C)."""
+        if interval <= 0:
+            raise click.ClickException("O intervalo deve ser maior que zero")
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+        click.echo(f"Criando snapshots a cada {interval:g} minutos.")
+        try:
+            BackupScheduler(manager, interval, full_every).run()
+        except KeyboardInterrupt:
+            click.echo("Agendamento encerrado.")
+
+    @backup_cli.command('list')
+    def list_snapshots():
+        """Lista os snapshots existentes."""
+        for manifest in manager.list_manifests():
+            click.echo(f"{manifest['name']}  {manifest['kind']:<11}  {manifest['size']} bytes")
+
+    @backup_cli.command('verify')
+    @click.argument('name')
+    @click.option('--deep', is_flag=True, help='Restaura num arquivo temporário e roda o integrity_check.')
+    def verify(name, deep):
+        """Verifica os checksums de um snapshot."""
+        try:
+            manager.verify(name, deep=deep)
+        except BackupError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Snapshot {name} verificado com sucesso.")
+
+    @backup_cli.command('restore')
+    @click.argument('name')
+    @click.argument('target')
+    def restore(name, target):
+        """Reconstrói o snapshot NAME no arquivo TARGET."""
+        try:
+            manager.restore(name, target)
+        except BackupError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Snapshot {name} restaurado em {target}.")
+
+    return backup_cli
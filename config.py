@@ -8,3 +8,15 @@ class Config:
     # Configuração do SQLAlchemy
     SQLALCHEMY_DATABASE_URI = 'sqlite:///autoar.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Configuração do backup online (comando 'flask backup')
+    BACKUP_DIR = 'backups'
+    BACKUP_PAGES_PER_STEP = 64
+    BACKUP_STEP_PAUSE = 0.005
+    # Limites da cópia: segundos e quantidade de reinícios antes de desistir
+    BACKUP_TIMEOUT = 600
+    BACKUP_MAX_RESTARTS = 3
+    # Intervalo padrão do comando 'flask backup schedule', em minutos
+    BACKUP_INTERVAL_MINUTES = 60
+    # A cada quantos snapshots agendados um é completo (os demais são incrementais)
+    BACKUP_FULL_EVERY = 24
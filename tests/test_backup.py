@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+
+import pytest
+
+from backup import BackupError, BackupManager, _BackupLock
+from models import Client, DatabaseManager
+
+
+@pytest.fixture
+def db_manager(tmp_path):
+    DatabaseManager._instance = None
+    manager = DatabaseManager(f"sqlite:///{tmp_path / 'autoar.db'}")
+    yield manager
+    manager.engine.dispose()
+    DatabaseManager._instance = None
+
+
+@pytest.fixture
+def backup_manager(db_manager, tmp_path):
+    return BackupManager(db_manager, backup_dir=str(tmp_path / 'backups'), pages_per_step=2, step_pause=0)
+
+
+def add_clients(db_manager, names):
+    session = db_manager.get_session()
+    try:
+        session.add_all([Client(name=name, address='x' * 150) for name in names])
+        session.commit()
+    finally:
+        session.close()
+
+
+def client_names(db_manager):
+    session = db_manager.get_session()
+    try:
+        return sorted(name for (name,) in session.query(Client.name))
+    finally:
+        session.close()
+
+
+def restored_names(path):
+    DatabaseManager._instance = None
+    restored = DatabaseManager(f"sqlite:///{path}")
+    try:
+        return client_names(restored)
+    finally:
+        restored.engine.dispose()
+
+
+def test_full_incremental_restore_round_trip(db_manager, backup_manager, tmp_path):
+    add_clients(db_manager, [f"cliente {i}" for i in range(200)])
+    full = backup_manager.create_snapshot()
+    expected_full = client_names(db_manager)
+
+    add_clients(db_manager, [f"novo {i}" for i in range(50)])
+    session = db_manager.get_session()
+    session.query(Client).filter(Client.name == 'cliente 0').update({'name': 'alterado'})
+    session.commit()
+    session.close()
+    incremental = backup_manager.create_snapshot(incremental=True)
+    expected_incremental = client_names(db_manager)
+
+    assert full.manifest['kind'] == 'full'
+    assert incremental.manifest['kind'] == 'incremental'
+    assert incremental.manifest['parent'] == full.manifest['name']
+    assert 0 < len(incremental.manifest['changed_pages']) < incremental.manifest['page_count']
+
+    backup_manager.verify(incremental.manifest['name'], deep=True)
+    backup_manager.restore(full.manifest['name'], str(tmp_path / 'full.db'))
+    backup_manager.restore(incremental.manifest['name'], str(tmp_path / 'incremental.db'))
+    assert restored_names(tmp_path / 'full.db') == expected_full
+    assert restored_names(tmp_path / 'incremental.db') == expected_incremental
+
+
+def test_verify_rejects_corrupted_delta(db_manager, backup_manager):
+    add_clients(db_manager, ['cliente'])
+    backup_manager.create_snapshot()
+    add_clients(db_manager, ['outro cliente'])
+    manifest = backup_manager.create_snapshot(incremental=True).manifest
+
+    path = os.path.join(backup_manager.backup_dir, manifest['file'])
+    with open(path, 'r+b') as f:
+        f.seek(-10, os.SEEK_END)
+        f.write(b'\x00' * 10)
+
+    with pytest.raises(BackupError, match='Checksum'):
+        backup_manager.verify(manifest['name'])
+
+
+def test_failed_restore_leaves_no_target(db_manager, backup_manager, tmp_path):
+    add_clients(db_manager, ['cliente'])
+    manifest = backup_manager.create_snapshot().manifest
+    manifest['page_hashes'][0] = '0' * 32
+    backup_manager.load_manifest = lambda name: manifest
+
+    target = tmp_path / 'restored.db'
+    with pytest.raises(BackupError):
+        backup_manager.restore(manifest['name'], str(target))
+    assert not target.exists()
+    assert not (tmp_path / 'restored.db.part').exists()
+
+
+def test_backup_completes_with_concurrent_writer(db_manager, backup_manager):
+    add_clients(db_manager, [f"cliente {i}" for i in range(2000)])
+    backup_manager.pages_per_step = 1
+    backup_manager.step_pause = 0.001
+    backup_manager.max_restarts = 0
+    backup_manager.timeout = 60
+
+    stop = threading.Event()
+    commits = []
+
+    def writer():
+        while not stop.is_set():
+            add_clients(db_manager, [f"concorrente {len(commits)}"])
+            commits.append(1)
+            time.sleep(0.002)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        report = backup_manager.create_snapshot()
+    finally:
+        stop.set()
+        thread.join()
+
+    assert commits
+    assert report.restarts == 0
+    assert report.pages_copied == report.manifest['page_count']
+    assert report.stall_samples > 0
+    backup_manager.verify(report.manifest['name'], deep=True)
+    assert not [f for f in os.listdir(backup_manager.backup_dir) if f.startswith('.snapshot-')]
+
+
+def test_snapshot_refused_while_another_is_running(db_manager, backup_manager):
+    os.makedirs(backup_manager.backup_dir)
+    with _BackupLock(os.path.join(backup_manager.backup_dir, '.lock')):
+        with pytest.raises(BackupError, match='andamento'):
+            backup_manager.create_snapshot()